@@ -1,5 +1,5 @@
 import streamlit as st
-from db_manager import Database, LEVELS, LEVELS_REV, DEFAULT_TAG_COLORS
+from db_manager import Database, LEVELS, LEVELS_REV, DEFAULT_TAG_COLORS, NEXT_UP_WEIGHTS, WEEK_DAYS, get_render_cache
 import datetime
 
 # --- YAPILANDIRMA ---
@@ -9,25 +9,26 @@ st.set_page_config(page_title="LifeManager V5.4", page_icon="⚡", layout="wide"
 if 'db' not in st.session_state:
     st.session_state.db = Database()
 db = st.session_state.db
+render_cache = get_render_cache() # Tüm oturumlar için ortak HTML memo'su
 
 # --- DİNAMİK RENK YÜKLEME ---
-# Veritabanından seviye renklerini çekiyoruz
-level_colors = db.get_level_colors() # {'imp': {1: '#...', ...}, 'eff': {...}}
-
-# CSS Oluşturucu
-css_dynamic = ""
-for lvl, color in level_colors.get('imp', {}).items():
-    # Orta seviye (3) için siyah yazı, diğerleri beyaz
-    text_col = 'black' if lvl == 3 else 'white'
-    css_dynamic += f".imp-{lvl} {{ background-color: {color}; color: {text_col} !important; padding: 2px 6px; border-radius: 4px; font-size: 11px; font-weight: bold; }}\n"
-
-for lvl, color in level_colors.get('eff', {}).items():
-    # Çaba renkleri
-    css_dynamic += f".eff-{lvl} {{ background-color: {color}; color: white !important; padding: 2px 6px; border-radius: 4px; font-size: 11px; }}\n"
-
-
-# --- CSS: ULTIMATE DARK & DYNAMIC ---
-st.markdown(f"""
+def build_style():
+    # Veritabanından seviye renklerini çekiyoruz
+    level_colors = db.get_level_colors() # {'imp': {1: '#...', ...}, 'eff': {...}}
+
+    # CSS Oluşturucu
+    css_dynamic = ""
+    for lvl, color in level_colors.get('imp', {}).items():
+        # Orta seviye (3) için siyah yazı, diğerleri beyaz
+        text_col = 'black' if lvl == 3 else 'white'
+        css_dynamic += f".imp-{lvl} {{ background-color: {color}; color: {text_col} !important; padding: 2px 6px; border-radius: 4px; font-size: 11px; font-weight: bold; }}\n"
+
+    for lvl, color in level_colors.get('eff', {}).items():
+        # Çaba renkleri
+        css_dynamic += f".eff-{lvl} {{ background-color: {color}; color: white !important; padding: 2px 6px; border-radius: 4px; font-size: 11px; }}\n"
+
+    # --- CSS: ULTIMATE DARK & DYNAMIC ---
+    return f"""
 <style>
     /* 1. KESİN ARKA PLAN */
     .stApp {{
@@ -127,7 +128,10 @@ st.markdown(f"""
     {css_dynamic}
 
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Stil bloğu sadece seviye renkleri değişince yeniden oluşturulur
+st.markdown(render_cache.get_or_set(('css', db.get_snapshot_version('level_colors')), build_style), unsafe_allow_html=True)
 
 # --- STATE ---
 if 'active_folder_id' not in st.session_state: st.session_state.active_folder_id = None
@@ -170,6 +174,8 @@ with st.sidebar:
         sel_tags, sel_imps, sel_effs, current_sort = [], [], [], 'date'
 
 # --- HTML HELPER (Dinamik CSS classları kullanıyor) ---
+tag_color_version = db.get_snapshot_version('tags') # Sadece etiketler değişince değişir (gerekirse önce yükler)
+
 def render_badges(imp, eff, tag):
     # Artık renkleri DB'den gelen CSS classları yönetiyor (imp-1, eff-2 vb.)
     imp_html = f'<span class="imp-{imp}">{LEVELS_REV[imp]}</span>'
@@ -180,12 +186,44 @@ def render_badges(imp, eff, tag):
         tag_html = f'<span style="background-color: {color}; padding: 2px 6px; border-radius: 4px; font-size: 11px; font-weight: bold; margin-right: 5px; color: white !important;">{tag}</span>'
     return f"{tag_html} {imp_html} {eff_html}"
 
+CARD_STYLES = {
+    'dashboard': "font-size:15px; margin-bottom:4px; color: #E3E3E3;",
+    'folder': "font-weight:500; font-size:15px; color:#E3E3E3;",
+}
+
+def render_task_card(task, style, suffix=""):
+    # Anahtar: satırın kendisi (id + içerik = satır versiyonu) ve etiket renklerinin versiyonu.
+    # Değişmeyen kartlar rerun'da yeniden formatlanmaz.
+    _, _, txt, _, imp, eff, _, tag = task
+    key = ('card', style, task, suffix, tag_color_version)
+    return render_cache.get_or_set(key, lambda: f"<div style='{CARD_STYLES[style]}'>{txt}{suffix}</div>{render_badges(imp, eff, tag)}")
+
 # ==============================================================================
 # SAYFA: DASHBOARD
 # ==============================================================================
 if selected_page == "Dashboard":
     st.markdown("## 📊 Genel Bakış")
     folders = db.get_folders('todo')
+    folder_names = {f[0]: f[1] for f in folders}
+
+    # --- SIRADAKİ İŞLER (Tüm klasörlerde skora göre ilk 20) ---
+    c1, c2 = st.columns([0.8, 0.2])
+    c1.markdown("### 🎯 Sıradaki İşler")
+    with c2.popover("⚙️ Skor"):
+        w_imp = st.slider("Önem ağırlığı", 0.0, 3.0, NEXT_UP_WEIGHTS['importance'], 0.1)
+        w_eff = st.slider("Az çaba ağırlığı", 0.0, 3.0, NEXT_UP_WEIGHTS['effort'], 0.1)
+        w_age = st.slider("Yaş ağırlığı (gün başı)", 0.0, 1.0, NEXT_UP_WEIGHTS['age'], 0.05)
+    next_up = db.get_next_up(20, {'importance': w_imp, 'effort': w_eff, 'age': w_age}, tag_list=sel_tags, imp_list=sel_imps, eff_list=sel_effs)
+    with st.expander(f"🎯 İlk {len(next_up)}", expanded=True):
+        for task in next_up:
+            tid, t_fid, txt, done, imp, eff, date, tag = task
+            c1, c2, c3 = st.columns([0.05, 0.85, 0.1])
+            if c1.checkbox("", key=f"nx_{tid}"): db.toggle_todo(tid, 0); st.rerun()
+            c2.markdown(render_task_card(task, 'dashboard', f" <small style='color:#888'>📁 {folder_names.get(t_fid, '')}</small>"), unsafe_allow_html=True)
+            if c3.button("🗑", key=f"nxd_{tid}"): db.delete_todo(tid); st.rerun()
+        if not next_up: st.caption("Yapılacak iş yok.")
+
+    st.markdown("### 📁 Klasörler")
     has_task = False
     
     for folder in folders:
@@ -203,7 +241,7 @@ if selected_page == "Dashboard":
                     tid, _, txt, done, imp, eff, date, tag = task
                     c1, c2, c3 = st.columns([0.05, 0.85, 0.1])
                     if c1.checkbox("", key=f"d_{tid}"): db.toggle_todo(tid, 0); st.rerun()
-                    c2.markdown(f"<div style='font-size:15px; margin-bottom:4px; color: #E3E3E3;'>{txt}</div>{render_badges(imp, eff, tag)}", unsafe_allow_html=True)
+                    c2.markdown(render_task_card(task, 'dashboard'), unsafe_allow_html=True)
                     if c3.button("🗑", key=f"dd_{tid}"): db.delete_todo(tid); st.rerun()
     if not has_task: st.info("Yapılacak iş yok.")
 
@@ -304,7 +342,7 @@ elif selected_page == "Görevler":
                 with st.container(border=True):
                     c1, c2, c3 = st.columns([0.05, 0.75, 0.2])
                     if c1.checkbox("", key=f"L_{tid}"): db.toggle_todo(tid, 0); st.rerun()
-                    c2.markdown(f"<div style='font-weight:500; font-size:15px; color:#E3E3E3;'>{txt}</div>{render_badges(imp, eff, tag)}", unsafe_allow_html=True)
+                    c2.markdown(render_task_card(task, 'folder'), unsafe_allow_html=True)
                     b1, b2 = c3.columns(2)
                     if b1.button("✏️", key=f"E_{tid}"): st.session_state.editing_task_id = tid; st.rerun()
                     if b2.button("🗑", key=f"D_{tid}"): db.delete_todo(tid); st.rerun()
@@ -394,7 +432,17 @@ elif selected_page == "Notlar":
 # ==============================================================================
 elif selected_page == "Haftalık Rutin":
     st.markdown("## 📅 Haftalık Rutinler")
-    days = ['Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar']
+    # Tüm hafta, şu an/sıradaki ve çakışmalar tek indeksten
+    week = db.get_week()
+    overlaps = db.get_routine_overlaps()
+    multi_day = db.get_multi_day_routines()
+    today_i = datetime.date.today().weekday()
+    current, upcoming = db.get_routine_now_next()
+    c1, c2 = st.columns(2)
+    c1.info("▶️ Şu an: " + (", ".join(f"[{t[2]}] {t[3]}" for t in current) if current else "—"))
+    c2.info(f"⏭ Sıradaki: [{upcoming[0]} {upcoming[1][2]}] {upcoming[1][3]}" if upcoming else "⏭ Sıradaki: —")
+
+    days = WEEK_DAYS
     tabs = st.tabs(days)
     
     for i, day in enumerate(days):
@@ -406,16 +454,22 @@ elif selected_page == "Haftalık Rutin":
                     rx = c2.text_input("Rutin")
                     if c3.form_submit_button("Ekle", type="primary"): db.add_weekly_task(day, rt, rx); st.rerun()
             
-            tasks = db.get_weekly_tasks(day)
+            tasks = week[day]
             for t in tasks:
                 t_id, _, t_time, t_text, t_done, _ = t
                 with st.container(border=True):
                     c1, c2, c3 = st.columns([0.05, 0.85, 0.1])
-                    check = c1.checkbox("", value=bool(t_done), key=f"wr_{t_id}")
-                    if check != bool(t_done): db.toggle_weekly_task(t_id, check); st.rerun()
+                    # Çok günlü rutinin tek is_done'u bugünün tekrarına ait; diğer sekmelerde işaretlenemez
+                    if t_id in multi_day and i != today_i:
+                        t_done = 0
+                        c1.markdown("<span title='Her tekrar kendi gününde işaretlenir'>🔁</span>", unsafe_allow_html=True)
+                    else:
+                        check = c1.checkbox("", value=bool(t_done), key=f"wr_{day}_{t_id}")
+                        if check != bool(t_done): db.toggle_weekly_task(t_id, check); st.rerun()
                     style = "text-decoration: line-through; color: #888;" if t_done else "color: #E3E3E3; font-weight: bold;"
-                    c2.markdown(f"<span style='{style}'>[{t_time}] {t_text}</span>", unsafe_allow_html=True)
-                    if c3.button("🗑", key=f"wd_{t_id}"): db.delete_weekly_task(t_id); st.rerun()
+                    warn = " <span title='Başka bir rutinle çakışıyor'>⚠️</span>" if t_id in overlaps else ""
+                    c2.markdown(f"<span style='{style}'>[{t_time}] {t_text}</span>{warn}", unsafe_allow_html=True)
+                    if c3.button("🗑", key=f"wd_{day}_{t_id}"): db.delete_weekly_task(t_id); st.rerun()
 
 # ==============================================================================
 # SAYFA: AYARLAR
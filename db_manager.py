@@ -5,14 +5,57 @@ from datetime import datetime
 import random
 import streamlit as st
 import os
+import re
+import json
+import logging
+import sqlite3
+import threading
 import time
-from gspread.exceptions import APIError
+import uuid
+from contextlib import closing
+from collections import Counter, OrderedDict
+from bisect import bisect_left, insort
+from gspread.exceptions import APIError, WorksheetNotFound
+
+logger = logging.getLogger(__name__)
 
 # --- SABİTLER ---
 SHEET_NAME = 'LifeManager_DB'
 LEVELS = {'Çok Düşük': 1, 'Düşük': 2, 'Orta': 3, 'Yüksek': 4, 'Çok Yüksek': 5}
 LEVELS_REV = {v: k for k, v in LEVELS.items()}
+WEEK_DAYS = ['Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar'] # datetime.weekday() sırası
 DEFAULT_TAG_COLORS = ['#E74C3C', '#8E44AD', '#3498DB', '#1ABC9C', '#F1C40F', '#E67E22', '#7F8C8D', '#2ECC71', '#34495E', '#D35400']
+CACHE_TTL = 600 # saniye
+REVISION_TTL = 60 # Uzak revizyon (son değişiklik zamanı) bu kadar saniye hafızada tutulur
+# Disk cache: yeniden başlatmada sayfalar Google yerine buradan okunur ('' = kapalı)
+SNAPSHOT_CACHE_PATH = os.environ.get('LIFEMANAGER_SNAPSHOT_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'snapshots.sqlite'))
+SNAPSHOT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+SNAPSHOT_VERIFY_DELAY = 2 # saniye; bu sürede indirilen sayfalar tek revizyon okumasıyla doğrulanıp diske yazılır
+RENDER_CACHE_SIZE = 5000 # Hafızada tutulan HTML parçası sayısı
+# "Sıradaki İşler" skoru: önem * w + (6 - çaba) * w + gün cinsinden yaş * w
+NEXT_UP_WEIGHTS = {'importance': 1.0, 'effort': 0.5, 'age': 0.1}
+
+# --- DEPOLAMA MODU ---
+# 'direct': her yazma ilgili sayfada find + hücre güncelleme/satır silme yapar
+# 'events': her yazma 'events' sayfasına tek bir satır olarak eklenir (append-only)
+STORAGE_MODE = os.environ.get('LIFEMANAGER_STORAGE_MODE', 'direct')
+EVENTS_WORKSHEET = 'events'
+EVENTS_ARCHIVE_WORKSHEET = 'events_archive'
+EVENTS_LOCK_WORKSHEET = 'events_lock' # Süreçler arası katlama kilidi (A2: sahip, B2: bitiş zamanı)
+EVENT_HEADERS = ['ts', 'op', 'worksheet', 'key', 'data', 'event_id']
+EVENT_COMPACT_THRESHOLD = 500 # Bu kadar event birikince sayfalara katlanır
+EVENT_COMPACT_LEASE = 300 # saniye; yarıda kalan katlamanın kilidi bu süreden sonra düşer
+EVENT_COMPACT_RETRY_INTERVAL = 60 # saniye; katlama denemeleri arasında en az bu kadar beklenir
+WORKSHEET_HEADERS = {
+    'folders': ['id', 'name', 'type', 'tag'],
+    'todos': ['id', 'folder_id', 'task', 'is_done', 'importance', 'effort', 'date', 'tag'],
+    'notes': ['id', 'folder_id', 'title', 'content', 'date'],
+    'weekly_schedule': ['id', 'day_name', 'time_range', 'task', 'is_done', 'last_completed_date'],
+    'tags': ['name', 'color'],
+    'folder_tags': ['name', 'color'],
+    'level_colors': ['level_type', 'level_value', 'color'],
+}
+KEY_COLUMNS = {'tags': ['name'], 'folder_tags': ['name'], 'level_colors': ['level_type', 'level_value']} # Diğerleri: ['id']
 
 # --- RETRY DECORATOR (HATA YAKALAYICI) ---
 def retry_api_call(func):
@@ -57,9 +100,7 @@ def get_gspread_client():
         
     return gspread.authorize(creds)
 
-# Veriyi hafızada tutar (600 saniye = 10 dakika boyunca Google'a gitmez)
-@st.cache_data(ttl=600) 
-def fetch_sheet_data(sheet_name, worksheet_name):
+def download_sheet_data(sheet_name, worksheet_name):
     client = get_gspread_client()
     try:
         # Retry mantığını burada manuel uyguluyoruz çünkü decorator cache ile bazen çakışır
@@ -76,26 +117,661 @@ def fetch_sheet_data(sheet_name, worksheet_name):
     except:
         return pd.DataFrame() # Hata olursa boş dön
 
+# --- DİSK CACHE ---
+class SnapshotCache:
+    """Sayfa verilerini (sayfa, revizyon) anahtarıyla SQLite dosyasında tutar.
+
+    Dosya mmap ile okunur; toplam boyut max_bytes'ı aşarsa en eski erişilenler silinir.
+    """
+    def __init__(self, path, max_bytes=SNAPSHOT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending = []      # (tablo, sayfa, indirme öncesi revizyon, df, nesil)
+        self._generations = {}  # (tablo, sayfa) -> discard sayacı; arada silinen kayıt yazılmaz
+        self._flush_timer = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute(f'PRAGMA mmap_size={self.max_bytes * 2}')
+        conn.execute('''CREATE TABLE IF NOT EXISTS snapshots (
+            sheet TEXT, worksheet TEXT, revision TEXT, data TEXT, size INTEGER, saved_at REAL, accessed_at REAL,
+            PRIMARY KEY (sheet, worksheet))''')
+        return conn
+
+    def load(self, sheet_name, worksheet_name, revision):
+        """Revizyon eşleşirse DataFrame, yoksa None. Revizyon bilinmiyorsa CACHE_TTL'den yeni kayıt kabul edilir."""
+        try:
+            with closing(self._connect()) as conn, conn: # closing: bağlantıyı kapat, conn: commit/rollback
+                row = conn.execute('SELECT revision, data, saved_at FROM snapshots WHERE sheet=? AND worksheet=?',
+                                   (sheet_name, worksheet_name)).fetchone()
+                if row is None: return None
+                saved_rev, data, saved_at = row
+                if revision is None and time.time() - saved_at > CACHE_TTL: return None
+                if revision is not None and saved_rev != revision: return None
+                conn.execute('UPDATE snapshots SET accessed_at=? WHERE sheet=? AND worksheet=?',
+                             (time.time(), sheet_name, worksheet_name))
+            return pd.DataFrame(json.loads(data))
+        except (sqlite3.Error, OSError, ValueError):
+            return None
+
+    def store(self, sheet_name, worksheet_name, revision, df):
+        try:
+            data = df.to_json(orient='records', force_ascii=False)
+            now = time.time()
+            with closing(self._connect()) as conn, conn:
+                conn.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (sheet_name, worksheet_name, revision, data, len(data), now, now))
+                self._evict(conn)
+        except (sqlite3.Error, OSError, ValueError):
+            pass # Disk cache opsiyonel, hata olursa sadece yazılmaz
+
+    def defer_store(self, sheet_name, worksheet_name, revision, df):
+        """İndirilen veriyi sıraya alır; SNAPSHOT_VERIFY_DELAY sonra indirmelerden sonra okunan tek bir
+        revizyonla doğrulanır. Revizyon indirme öncesiyle aynıysa veri o revizyona aittir ve yazılır."""
+        with self._lock:
+            self._pending.append((sheet_name, worksheet_name, revision, df, self._generations.get((sheet_name, worksheet_name), 0)))
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(SNAPSHOT_VERIFY_DELAY, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending, self._flush_timer = self._pending, [], None
+        revisions = {} # Tablo başına tek okuma; hepsi sıradaki indirmeler bittikten sonra
+        for sheet_name, worksheet_name, revision, df, generation in batch:
+            if sheet_name not in revisions: revisions[sheet_name] = get_remote_revision(sheet_name)
+            if revisions[sheet_name] != revision: continue
+            with self._lock: # Arada discard olduysa (yazma) eski veriyi yazma
+                if self._generations.get((sheet_name, worksheet_name), 0) == generation:
+                    self.store(sheet_name, worksheet_name, revision, df)
+
+    def discard(self, sheet_name, worksheet_name=None):
+        """Yazma sonrası disk kopyasını sil (worksheet_name None ise tüm tablo); bekleyen kayıtlar da yazılmaz."""
+        with self._lock:
+            keys = [(s, w) for s, w, *_ in self._pending if s == sheet_name] if worksheet_name is None else [(sheet_name, worksheet_name)]
+            if worksheet_name is None: keys += [k for k in self._generations if k[0] == sheet_name]
+            for k in set(keys): self._generations[k] = self._generations.get(k, 0) + 1
+            try:
+                with closing(self._connect()) as conn, conn:
+                    if worksheet_name is None: conn.execute('DELETE FROM snapshots WHERE sheet=?', (sheet_name,))
+                    else: conn.execute('DELETE FROM snapshots WHERE sheet=? AND worksheet=?', (sheet_name, worksheet_name))
+            except (sqlite3.Error, OSError):
+                pass
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM snapshots').fetchone()[0]
+        for sheet, worksheet, size in conn.execute('SELECT sheet, worksheet, size FROM snapshots ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes: break
+            conn.execute('DELETE FROM snapshots WHERE sheet=? AND worksheet=?', (sheet, worksheet))
+            total -= size
+
+snapshot_cache = SnapshotCache(SNAPSHOT_CACHE_PATH) if SNAPSHOT_CACHE_PATH else None
+
+# Tablonun son değişiklik zamanı; tek istekle tüm sayfaların disk kopyasını doğrular
+def get_remote_revision(sheet_name):
+    try:
+        return str(get_gspread_client().open(sheet_name).lastUpdateTime)
+    except:
+        return None
+
+@st.cache_data(ttl=REVISION_TTL)
+def fetch_remote_revision(sheet_name):
+    return get_remote_revision(sheet_name)
+
+def read_sheet_data(sheet_name, worksheet_name):
+    """Önce disk cache (revizyon tutuyorsa), yoksa Google'dan indirip diske yazar."""
+    if snapshot_cache is None: return download_sheet_data(sheet_name, worksheet_name)
+    revision = fetch_remote_revision(sheet_name)
+    df = snapshot_cache.load(sheet_name, worksheet_name, revision)
+    if df is not None: return df
+    df = download_sheet_data(sheet_name, worksheet_name)
+    # Diske, indirme boyunca revizyon değişmediği (sonradan okunan revizyonla) doğrulanınca yazılır;
+    # aynı anda inen sayfalar tek okumayla doğrulanır
+    if df is not None and not df.empty and revision is not None:
+        snapshot_cache.defer_store(sheet_name, worksheet_name, revision, df)
+    return df
+
+# --- PAYLAŞILAN SNAPSHOT (tüm oturumlar için tek kopya) ---
+class SnapshotStore:
+    """Süreç genelinde, thread-safe sayfa snapshot'ları.
+
+    Aynı sayfayı aynı anda isteyen N oturumdan sadece biri indirir (single-flight), diğerleri
+    onu bekler. Her anahtarın bir versiyonu vardır; yazan oturum değişikliği apply() ile
+    snapshot'a uygular, diğerleri yeni versiyonu tekrar indirmeden görür.
+    Dönen DataFrame'ler paylaşılır, yerinde değiştirilmemeli.
+    """
+    def __init__(self, loader, ttl=CACHE_TTL):
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # anahtar -> (df, yüklenme zamanı)
+        self._versions = {} # anahtar -> versiyon (her yükleme/yayın/silmede artar)
+        self._inflight = {} # anahtar -> threading.Event
+
+    def version(self, key):
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def get(self, key):
+        """(versiyon, df) döner; gerekirse indirir."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and time.time() - entry[1] < self._ttl:
+                    return self._versions[key], entry[0]
+                waiter = self._inflight.get(key)
+                leader = waiter is None
+                if leader:
+                    waiter = self._inflight[key] = threading.Event()
+                    start_version = self._versions.get(key, 0)
+            if not leader:
+                waiter.wait()
+                continue # Lider bitirdi (veya hata aldı), baştan kontrol et
+            try:
+                df = self._loader(*key)
+                with self._lock:
+                    # İndirme sürerken biri yazdıysa bu veri eski olabilir, tekrar dene
+                    if self._versions.get(key, 0) == start_version:
+                        self._versions[key] = start_version + 1
+                        self._entries[key] = (df, time.time())
+                        return self._versions[key], df
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                waiter.set()
+
+    def apply(self, key, fn):
+        """Snapshot'ı fn(df) ile günceller ve yeni versiyonu yayınlar. fn None dönerse snapshot atılır."""
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            entry = self._entries.get(key)
+            if entry is None: return
+            df = fn(entry[0])
+            if df is None: del self._entries[key]
+            else: self._entries[key] = (df, entry[1])
+
+    def invalidate(self, key=None):
+        with self._lock:
+            for k in ([key] if key is not None else list(self._entries)):
+                self._entries.pop(k, None)
+                self._versions[k] = self._versions.get(k, 0) + 1
+
+# Client gibi süreç boyunca tek örnek
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore(read_sheet_data)
+
+# Veriyi hafızada tutar (600 saniye = 10 dakika boyunca Google'a gitmez)
+def fetch_sheet_data(sheet_name, worksheet_name):
+    return get_snapshot_store().get((sheet_name, worksheet_name))[1]
+
+def fetch_events(sheet_name):
+    return fetch_sheet_data(sheet_name, EVENTS_WORKSHEET)
+
+# --- RENDER CACHE ---
+class LRUCache:
+    """Thread-safe, boyutu sınırlı memo. Dolunca en eski kullanılan silinir."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, fn):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = fn()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize: self._data.popitem(last=False)
+        return value
+
+# Kart/rozet HTML'i ve CSS tüm oturumlarda aynı, tek cache yeterli
+@st.cache_resource
+def get_render_cache():
+    return LRUCache(RENDER_CACHE_SIZE)
+
+# Event modunda eventlerin uygulanmış hali: (sayfa, sayfa versiyonu, events versiyonu) -> DataFrame
+@st.cache_resource
+def get_replay_cache():
+    return LRUCache(64)
+
+_compaction_lock = threading.Lock() # Aynı süreçte tek katlama
+_compaction_trigger = {'lock': threading.Lock(), 'last_attempt': 0.0} # Arka plan tetikleyicisinin durumu
+
+# --- EVENT LOG ---
+def _to_plain(value):
+    """numpy sayılarını JSON'a yazılabilir Python tiplerine çevirir."""
+    return value.item() if hasattr(value, 'item') else value
+
+def apply_changes(df, worksheet_name, changes):
+    """(op, anahtar listesi, veri) değişikliklerini sırayla sayfa DataFrame'ine uygular, yeni DataFrame döner."""
+    key_cols = KEY_COLUMNS.get(worksheet_name, ['id'])
+    rows = {}
+    if not df.empty:
+        for rec in df.to_dict('records'):
+            rows[tuple(str(rec.get(c)) for c in key_cols)] = rec
+    for op, key, data in changes:
+        k = tuple(str(x) for x in key)
+        if op == 'upsert': rows[k] = {**rows.get(k, {}), **data}
+        elif op == 'update' and k in rows: rows[k] = {**rows[k], **data}
+        elif op == 'delete': rows.pop(k, None)
+    return pd.DataFrame(list(rows.values()), columns=WORKSHEET_HEADERS[worksheet_name])
+
+def _event_marks(events):
+    """{sayfa: (event sayısı, son event_id)}; sayfa başına event versiyonu."""
+    marks = {}
+    if events is None or events.empty: return marks
+    for worksheet_name, event_id in events.reindex(columns=['worksheet', 'event_id']).itertuples(index=False, name=None):
+        marks[worksheet_name] = (marks.get(worksheet_name, (0, ''))[0] + 1, str(event_id))
+    return marks
+
+def replay_events(df, worksheet_name, events):
+    """Sayfa snapshot'ına o sayfanın eventlerini sırayla uygular.
+
+    Eventler idempotent (upsert/update/delete hepsi 'şu değere ayarla' şeklinde), bu yüzden
+    zaten katlanmış bir eventin tekrar uygulanması sonucu değiştirmez.
+    """
+    if events is None or events.empty: return df
+    events = events[events['worksheet'] == worksheet_name]
+    if events.empty: return df
+    return apply_changes(df, worksheet_name, ((op, json.loads(key), json.loads(data) if data else {})
+                                              for op, key, data in events[['op', 'key', 'data']].itertuples(index=False, name=None)))
+
+# --- SIRADAKİ İŞLER İNDEKSİ ---
+def parse_todo_date(value, now=None):
+    """'04 Jan, 21:35' gibi yılsız görev tarihini datetime'a çevirir.
+
+    Tarihte yıl olmadığı için son 12 ay içinde varsayılır; bir yıldan eski görevlerin yaşı
+    olduğundan kısa hesaplanır. Çözülemeyen tarih 'şimdi' (yaş 0) sayılır.
+    """
+    now = now or datetime.now()
+    try:
+        dt = datetime.strptime(str(value), '%d %b, %H:%M').replace(year=now.year)
+    except ValueError:
+        return now
+    if dt > now: dt = dt.replace(year=now.year - 1) # Gelecekte olamaz, geçen yıla ait
+    return dt
+
+def _to_int(value):
+    try: return int(value)
+    except (TypeError, ValueError): return None
+
+class NextUpIndex:
+    """Açık görevleri skora göre sıralı tutar. İlk k görev için tüm listeyi sıralamaya gerek kalmaz.
+
+    Yaş terimi oluşturulma zamanına bağlı ve doğrusal olduğu için sıralama zamanla bozulmaz;
+    bu yüzden anahtarlar bir kez hesaplanıp ekleme/silmede yerinde güncellenir.
+    """
+    def __init__(self, weights=None):
+        self.weights = dict(weights or NEXT_UP_WEIGHTS)
+        self.version = None # Kurulduğu snapshot versiyonu
+        self._keys = [] # Sıralı: (-skor, -id), sadece açık görevler
+        self._rows = {} # id -> (anahtar, satır), tüm görevler
+
+    @classmethod
+    def from_df(cls, df, weights=None):
+        idx = cls(weights)
+        if df.empty: return idx
+        cols = ['id', 'folder_id', 'task', 'is_done', 'importance', 'effort', 'date', 'tag']
+        for row in df[cols].itertuples(index=False, name=None):
+            tid = _to_int(row[0])
+            if tid is None: continue # id'siz satır güncellenemez, atla
+            key = idx._key(row)
+            idx._rows[tid] = (key, row)
+            if key is not None and _to_int(row[3]) == 0: idx._keys.append(key)
+        idx._keys.sort() # Sadece kurulumda bir kez
+        return idx
+
+    def _key(self, row):
+        """Sıralama anahtarı; önem/çaba sayı değilse (boş hücre vb.) None = puanlanmaz, listelenmez."""
+        tid, imp, eff = _to_int(row[0]), _to_int(row[4]), _to_int(row[5])
+        if None in (tid, imp, eff): return None
+        w = self.weights
+        created_days = parse_todo_date(row[6]).timestamp() / 86400
+        score = w['importance'] * imp + w['effort'] * (6 - eff) - w['age'] * created_days
+        return (-score, -tid)
+
+    def get(self, todo_id):
+        entry = self._rows.get(_to_int(todo_id))
+        return entry[1] if entry else None
+
+    def put(self, row):
+        tid = _to_int(row[0])
+        if tid is None: return
+        self.discard(tid)
+        key = self._key(row)
+        self._rows[tid] = (key, row)
+        if key is not None and _to_int(row[3]) == 0: insort(self._keys, key)
+
+    def discard(self, todo_id):
+        entry = self._rows.pop(_to_int(todo_id), None)
+        if entry is None or entry[0] is None: return
+        i = bisect_left(self._keys, entry[0])
+        if i < len(self._keys) and self._keys[i] == entry[0]: del self._keys[i]
+
+    def top(self, k, predicate=None):
+        res = []
+        for key in self._keys:
+            row = self._rows[-key[1]][1]
+            if predicate is None or predicate(row):
+                res.append(row)
+                if len(res) >= k: break
+        return res
+
+# --- HAFTALIK RUTİN İNDEKSİ ---
+_TIME_RE = re.compile(r'(\d{1,2})(?:[.:](\d{2}))?')
+
+def parse_time_range(text):
+    """'23.00-00.00', '09:30 - 10:15' veya '7' -> (başlangıç, bitiş) gün içi dakika. Saat değilse ('2 saat') (None, None).
+
+    Bitiş başlangıçtan önceyse gece yarısını geçiyordur, bitişe 1440 eklenir.
+    """
+    parts = [p.strip() for p in str(text).split('-')]
+    if len(parts) > 2: return None, None
+    mins = []
+    for p in parts:
+        m = _TIME_RE.fullmatch(p)
+        if not m or int(m.group(1)) > 24 or int(m.group(2) or 0) > 59: return None, None
+        mins.append(int(m.group(1)) * 60 + int(m.group(2) or 0))
+    start, end = mins[0], mins[-1]
+    if len(mins) == 2 and end <= start: end += 1440
+    return start, end
+
+def parse_weekday_mask(day_name):
+    """'Pazartesi' veya 'Pazartesi, Çarşamba' -> bit maskesi (bit 0 = Pazartesi)."""
+    mask = 0
+    for name in str(day_name).split(','):
+        name = name.strip()
+        if name in WEEK_DAYS: mask |= 1 << WEEK_DAYS.index(name)
+    return mask
+
+class RoutineIndex:
+    """weekly_schedule snapshot'ından tek geçişte kurulan haftalık indeks.
+
+    Saatler ve gün maskesi bir kez çözülür; gün listeleri, 'şu an / sıradaki' ve çakışmalar
+    haftalık dakika ekseninde (Pazartesi 00:00 = 0) sıralı aralıklardan okunur.
+    """
+    WEEK_MINUTES = 7 * 1440
+
+    def __init__(self, today):
+        self.today = today
+        self.version = None
+        self.by_day = [[] for _ in WEEK_DAYS]
+        self.stale_ids = [] # Dünden kalma 'tamamlandı' işaretleri (sıfırlanmalı)
+        self.overlap_ids = set()
+        self.multi_day_ids = set() # Birden çok güne yayılan rutinler (tek is_done paylaşırlar)
+        self._intervals = [] # (başlangıç, bitiş, satır), başlangıca göre sıralı
+        self._starts = []
+
+    @classmethod
+    def from_df(cls, df, today):
+        idx = cls(today)
+        if df.empty: return idx
+        days = [[] for _ in WEEK_DAYS]
+        for row in df[WORKSHEET_HEADERS['weekly_schedule']].itertuples(index=False, name=None):
+            t_id = _to_int(row[0])
+            if t_id is None: continue # id'siz satır işaretlenemez/silinemez, atla
+            if str(row[4]) == '1' and str(row[5]) != today:
+                idx.stale_ids.append(row[0])
+                row = (row[0], row[1], row[2], row[3], 0, '')
+            start, end = parse_time_range(row[2])
+            mask = parse_weekday_mask(row[1])
+            if mask & (mask - 1): idx.multi_day_ids.add(t_id)
+            for d in range(len(WEEK_DAYS)):
+                if not mask >> d & 1: continue
+                # Saatli olanlar saate göre, saatsizler ('2 saat') metne göre sonda
+                days[d].append(((start is None, start or 0, str(row[2]), t_id), row))
+                if start is not None: idx._intervals.append((d * 1440 + start, d * 1440 + end, row))
+        idx.by_day = [[row for _, row in sorted(day, key=lambda x: x[0])] for day in days]
+        idx._intervals.sort(key=lambda x: (x[0], x[1]))
+        idx._starts = [s for s, _, _ in idx._intervals]
+        idx._find_overlaps()
+        return idx
+
+    def _find_overlaps(self):
+        active = [] # (bitiş, id)
+        # Pazar gecesinden Pazartesiye taşanlar haftanın başına da eklenir
+        wrapped = [(s - self.WEEK_MINUTES, e - self.WEEK_MINUTES, row) for s, e, row in self._intervals if e > self.WEEK_MINUTES]
+        for s, e, row in wrapped + self._intervals:
+            active = [a for a in active if a[0] > s]
+            if active and e > s:
+                self.overlap_ids.add(row[0])
+                self.overlap_ids.update(t_id for _, t_id in active)
+            if e > s: active.append((e, row[0]))
+
+    def now_next(self, now):
+        """(şu an süren rutinler, (sıradaki rutinin günü, satır) veya None)
+
+        Çok günlü rutinde gün, satırdaki day_name listesi değil, sıradaki tekrarın günüdür.
+        """
+        t = now.weekday() * 1440 + now.hour * 60 + now.minute
+        current = [row for s, e, row in self._intervals if s <= t < e or s <= t + self.WEEK_MINUTES < e]
+        if not self._intervals: return current, None
+        i = bisect_left(self._starts, t + 1)
+        start, _, row = self._intervals[i % len(self._intervals)] # Haftanın sonundaysa başa sar
+        return current, (WEEK_DAYS[start // 1440], row)
+
 # --- DATABASE SINIFI ---
 class Database:
-    def __init__(self):
+    def __init__(self, storage_mode=None):
         # __init__ içinde API çağrısı YAPMIYORUZ. Hız için.
         self.client = get_gspread_client()
+        self.storage_mode = storage_mode or STORAGE_MODE
+        self._next_up = None # Sıradaki işler indeksi, ilk istekte kurulur
+        self._own_publishes = Counter() # Snapshot anahtarı -> bu oturumun yaptığı yayın sayısı
+        self._routines = None # Haftalık rutin indeksi, snapshot değişince yeniden kurulur
 
     def _get_sheet_obj(self):
         return self.client.open(SHEET_NAME)
 
     def _clear_cache(self):
-        """Yazma işlemi yapıldığında önbelleği temizle"""
-        fetch_sheet_data.clear()
+        """Tüm snapshot'ları at (sonraki okuma yeniden indirir)"""
+        get_snapshot_store().invalidate()
+        fetch_remote_revision.clear() # Disk kopyaları yeni revizyonla doğrulansın
+        if snapshot_cache: snapshot_cache.discard(SHEET_NAME)
+
+    def _publish(self, worksheet_name, op, key, data=None):
+        """Yazılan değişikliği paylaşılan snapshot'a uygular; diğer oturumlar tekrar indirmeden görür."""
+        # Boş snapshot indirme hatası olabilir, üzerine yazmak yerine yeniden indirilsin
+        self._own_publishes[(SHEET_NAME, worksheet_name)] += 1
+        get_snapshot_store().apply((SHEET_NAME, worksheet_name),
+                                   lambda df: None if df.empty else apply_changes(df, worksheet_name, [(op, key, data or {})]))
+        fetch_remote_revision.clear()
+        # Drive revizyonu gecikmeli güncellenebilir; yazma öncesi disk kopyası "geçerli" sanılmasın
+        if snapshot_cache: snapshot_cache.discard(SHEET_NAME, worksheet_name)
 
     # --- OKUMA (Hepsi Cache Kullanır) ---
     def _get_df(self, worksheet_name):
-        return fetch_sheet_data(SHEET_NAME, worksheet_name)
+        return self._snapshot(worksheet_name)[1]
+
+    def _snapshot(self, worksheet_name):
+        """(versiyon, df). Versiyon sadece bu sayfanın verisi değişince değişir ve veriyle birlikte okunur.
+
+        Event modunda versiyon: (sayfa snapshot versiyonu, bu sayfanın event sayısı, son event_id);
+        başka sayfalara yazılan eventler bu sayfanın versiyonunu (ve replay'ini) etkilemez.
+        """
+        store = get_snapshot_store()
+        ws_version, df = store.get((SHEET_NAME, worksheet_name))
+        if self.storage_mode != 'events': return ws_version, df
+        ev_version, events = store.get((SHEET_NAME, EVENTS_WORKSHEET))
+        cache = get_replay_cache()
+        marks = cache.get_or_set(('marks', ev_version), lambda: _event_marks(events))
+        version = (ws_version,) + marks.get(worksheet_name, (0, ''))
+        # Aynı snapshot için replay bir kez yapılır
+        return version, cache.get_or_set(('replay', worksheet_name) + version, lambda: replay_events(df, worksheet_name, events))
+
+    def _version_keys(self, worksheet_name):
+        keys = [(SHEET_NAME, worksheet_name)]
+        if self.storage_mode == 'events': keys.append((SHEET_NAME, EVENTS_WORKSHEET))
+        return keys
+
+    def get_snapshot_version(self, worksheet_name):
+        """Sayfa verisinin versiyonu (cache anahtarı olarak kullanılır); gerekirse önce veriyi yükler."""
+        return self._snapshot(worksheet_name)[0]
+
+    def _mark_versions(self, worksheet_name):
+        """Yazmadan önce: (sayfa versiyonu, [(anahtar, store versiyonu, kendi yayın sayımız)])"""
+        store = get_snapshot_store()
+        return (self.get_snapshot_version(worksheet_name),
+                [(k, store.version(k), self._own_publishes[k]) for k in self._version_keys(worksheet_name)])
+
+    def _only_own_writes(self, mark):
+        """İşaretten bu yana tüm versiyon artışları bu oturumun yayınlarından mı?"""
+        store = get_snapshot_store()
+        return all(store.version(k) - v == self._own_publishes[k] - c for k, v, c in mark[1])
+
+    # --- EVENT LOG (storage_mode='events') ---
+    def _get_or_create_ws(self, sh, worksheet_name, headers):
+        try:
+            return sh.worksheet(worksheet_name)
+        except WorksheetNotFound:
+            ws = sh.add_worksheet(title=worksheet_name, rows=1000, cols=len(headers))
+            ws.append_row(headers)
+            return ws
 
-    # --- YAZMA (Hepsi Retry Kullanır) ---
     @retry_api_call
+    def _append_event_row(self, event):
+        ws = self._get_or_create_ws(self._get_sheet_obj(), EVENTS_WORKSHEET, EVENT_HEADERS)
+        ws.append_row(event)
+
+    def _append_event(self, op, worksheet_name, key, data=None):
+        """Tek bir append ile yazma. Sayfa snapshot cache'leri temizlenmez, sadece event cache'i.
+
+        event_id bir kez üretilir: tekrar denemede aynı event iki kez yazılsa bile replay sonucu aynıdır.
+        """
+        key = [_to_plain(k) for k in key]
+        data = {c: _to_plain(v) for c, v in (data or {}).items()}
+        event = [datetime.now().strftime('%Y-%m-%d %H:%M:%S'), op, worksheet_name,
+                 json.dumps(key, ensure_ascii=False), json.dumps(data, ensure_ascii=False), uuid.uuid4().hex]
+        self._append_event_row(event)
+        self._own_publishes[(SHEET_NAME, EVENTS_WORKSHEET)] += 1
+        get_snapshot_store().apply((SHEET_NAME, EVENTS_WORKSHEET),
+                                   lambda df: None if df.empty else pd.concat([df, pd.DataFrame([event], columns=EVENT_HEADERS)], ignore_index=True))
+        fetch_remote_revision.clear()
+        if snapshot_cache: snapshot_cache.discard(SHEET_NAME, EVENTS_WORKSHEET)
+        if len(fetch_events(SHEET_NAME)) >= EVENT_COMPACT_THRESHOLD: self._schedule_compaction()
+
+    def _schedule_compaction(self):
+        """Katlamayı kullanıcı isteğinin dışında, arka plan thread'inde başlatır.
+
+        Çalışan bir katlama varsa veya son deneme EVENT_COMPACT_RETRY_INTERVAL'dan yeniyse başlatmaz;
+        kalıcı bir hata her yazmada tekrar denenmez.
+        """
+        with _compaction_trigger['lock']:
+            if _compaction_lock.locked() or time.time() - _compaction_trigger['last_attempt'] < EVENT_COMPACT_RETRY_INTERVAL:
+                return
+            _compaction_trigger['last_attempt'] = time.time()
+        threading.Thread(target=self._run_compaction, name='event-compaction', daemon=True).start()
+
+    def _run_compaction(self):
+        try:
+            n = self.compact_events()
+            if n: logger.info('%d event sayfalara katlandı', n)
+        except Exception:
+            # Eventler yerinde kalır (katlama idempotent), bir sonraki tetiklemede tekrar denenir
+            logger.exception('Event katlama başarısız, %d sn sonra tekrar denenecek', EVENT_COMPACT_RETRY_INTERVAL)
+
+    def _acquire_compaction_lease(self, sh):
+        """events_lock sayfasına süreli sahiplik yazar; başka süreç tutuyorsa None döner."""
+        ws = self._get_or_create_ws(sh, EVENTS_LOCK_WORKSHEET, ['owner', 'expires_at'])
+        row = ws.row_values(2)
+        try: expires = float(row[1]) if len(row) >= 2 else 0
+        except ValueError: expires = 0
+        if row[:1] and row[0] and expires > time.time(): return None
+        owner = uuid.uuid4().hex
+        ws.update(range_name='A2', values=[[owner, str(int(time.time() + EVENT_COMPACT_LEASE))]], value_input_option='RAW')
+        time.sleep(1) # Aynı anda yazan başka süreç varsa son yazan kazanır, tekrar okuyup kontrol et
+        return owner if ws.row_values(2)[:1] == [owner] else None
+
+    def _release_compaction_lease(self, sh, owner):
+        ws = sh.worksheet(EVENTS_LOCK_WORKSHEET)
+        if ws.row_values(2)[:1] == [owner]:
+            ws.update(range_name='A2', values=[['', '']], value_input_option='RAW')
+
+    def compact_events(self):
+        """Eventleri sayfalara katlar; katlananları arşive taşıyıp events sayfasından siler.
+
+        Süreç içinde kilit, süreçler arasında events_lock kaydı ile aynı anda tek katlama çalışır;
+        biri sürüyorsa 0 döner. Sadece okunan satırlar içerikleriyle bulunup silinir, okumadan
+        sonra eklenen eventler kalır. Yarıda kalan katlama tekrar çalışınca sonuç değişmez.
+        """
+        if not _compaction_lock.acquire(blocking=False): return 0
+        try:
+            sh = self._get_sheet_obj()
+            owner = self._acquire_compaction_lease(sh)
+            if owner is None: return 0
+            try: return self._compact(sh)
+            finally: self._release_compaction_lease(sh, owner)
+        finally:
+            _compaction_lock.release()
+
+    def _compact(self, sh):
+        ev_ws = self._get_or_create_ws(sh, EVENTS_WORKSHEET, EVENT_HEADERS)
+        values = ev_ws.get_all_values()
+        if len(values) <= 1: return 0
+        rows = values[1:]
+        events = pd.DataFrame(rows, columns=values[0])
+        for worksheet_name in events['worksheet'].unique():
+            if worksheet_name not in WORKSHEET_HEADERS: continue
+            ws = sh.worksheet(worksheet_name)
+            state = replay_events(pd.DataFrame(ws.get_all_records()), worksheet_name, events)
+            data = [WORKSHEET_HEADERS[worksheet_name]] + state.fillna('').values.tolist()
+            ws.update(range_name='A1', values=data)
+            ws.resize(rows=len(data)) # Silinen satırların kalıntısını at
+
+        # Arşiv: daha önce (yarıda kalan katlamada) arşivlenmiş event_id'ler tekrar yazılmaz
+        archive_ws = self._get_or_create_ws(sh, EVENTS_ARCHIVE_WORKSHEET, EVENT_HEADERS)
+        id_col = EVENT_HEADERS.index('event_id')
+        seen = set(archive_ws.col_values(id_col + 1)[1:])
+        new_rows = []
+        for r in rows:
+            event_id = r[id_col] if len(r) > id_col else ''
+            if event_id and event_id in seen: continue
+            seen.add(event_id)
+            new_rows.append(r)
+        if new_rows: archive_ws.append_rows(new_rows)
+
+        # Okuma sonrası eklenenler kalsın: satırları içerikleriyle bul, alttan yukarı blok blok sil
+        folded = Counter(tuple(r) for r in rows)
+        to_delete = []
+        for i, r in enumerate(ev_ws.get_all_values()[1:], start=2):
+            if folded[tuple(r)] > 0:
+                folded[tuple(r)] -= 1
+                to_delete.append(i)
+        while to_delete:
+            end = start = to_delete.pop()
+            while to_delete and to_delete[-1] == start - 1: start = to_delete.pop()
+            ev_ws.delete_rows(start, end)
+        self._clear_cache()
+        return len(rows)
+
+    def get_history(self, worksheet_name=None, limit=50):
+        """Değişiklik geçmişi (arşiv + bekleyen eventler), yeniden eskiye."""
+        parts = [p for p in (fetch_sheet_data(SHEET_NAME, EVENTS_ARCHIVE_WORKSHEET), fetch_events(SHEET_NAME)) if not p.empty]
+        if not parts: return []
+        df = pd.concat(parts, ignore_index=True)
+        if worksheet_name: df = df[df['worksheet'] == worksheet_name]
+        return list(df.reindex(columns=EVENT_HEADERS).tail(limit).iloc[::-1].itertuples(index=False, name=None))
+
+    # --- YAZMA (Hepsi Retry Kullanır) ---
     def _add_row(self, worksheet_name, row_data):
+        if self.storage_mode == 'events':
+            # Sayfayı okumadan id: milisaniye zaman damgası + 2 haneli rastgele ek (aynı ms'deki oturumlar
+            # çakışmaz, id sıralaması korunur). 15 haneyi geçmez; Sheets sayıları 15 anlamlı haneyle tutar.
+            # Tekrar denemede aynı id kullanılır; retry sadece append'te.
+            new_id = int(time.time() * 1000) * 100 + random.randrange(100)
+            self._append_event('upsert', worksheet_name, [new_id], dict(zip(WORKSHEET_HEADERS[worksheet_name], [new_id] + row_data)))
+            return new_id
+        return self._add_row_direct(worksheet_name, row_data)
+
+    @retry_api_call
+    def _add_row_direct(self, worksheet_name, row_data):
         sh = self._get_sheet_obj()
         ws = sh.worksheet(worksheet_name)
         try:
@@ -104,11 +780,24 @@ class Database:
         except: new_id = 1
         
         ws.append_row([new_id] + row_data)
-        self._clear_cache() # Önemli: Yazdıktan sonra cache'i temizle
+        self._publish(worksheet_name, 'upsert', [new_id], dict(zip(WORKSHEET_HEADERS[worksheet_name], [new_id] + row_data)))
         return new_id
 
-    @retry_api_call
     def _update_cell(self, worksheet_name, row_id, col_name, new_value):
+        return self._update_row(worksheet_name, row_id, {col_name: new_value})
+
+    def _update_row(self, worksheet_name, row_id, values):
+        """Bir satırın birden çok sütununu günceller, yazılabilen {sütun: değer}'i döner.
+
+        Event modunda tek bir 'update' eventi (tek append); direct modda hücre hücre.
+        """
+        if self.storage_mode == 'events':
+            self._append_event('update', worksheet_name, [row_id], values)
+            return dict(values)
+        return {col: val for col, val in values.items() if self._update_cell_direct(worksheet_name, row_id, col, val)}
+
+    @retry_api_call
+    def _update_cell_direct(self, worksheet_name, row_id, col_name, new_value):
         sh = self._get_sheet_obj()
         ws = sh.worksheet(worksheet_name)
         headers = ws.row_values(1)
@@ -116,18 +805,27 @@ class Database:
             col_idx = headers.index(col_name) + 1
             cell = ws.find(str(row_id), in_column=1)
             ws.update_cell(cell.row, col_idx, new_value)
-            self._clear_cache()
-        except: pass
+            self._publish(worksheet_name, 'update', [row_id], {col_name: new_value})
+            return True
+        except: return False
 
-    @retry_api_call
     def _delete_row(self, worksheet_name, row_id):
+        """Satırı siler; silindiyse True."""
+        if self.storage_mode == 'events':
+            self._append_event('delete', worksheet_name, [row_id])
+            return True
+        return self._delete_row_direct(worksheet_name, row_id)
+
+    @retry_api_call
+    def _delete_row_direct(self, worksheet_name, row_id):
         sh = self._get_sheet_obj()
         ws = sh.worksheet(worksheet_name)
         try:
             cell = ws.find(str(row_id), in_column=1)
             ws.delete_rows(cell.row)
-            self._clear_cache()
-        except: pass
+            self._publish(worksheet_name, 'delete', [row_id])
+            return True
+        except: return False
 
     # --- RENKLER ---
     def get_level_colors(self):
@@ -141,6 +839,8 @@ class Database:
         return res
 
     def update_level_color(self, ltype, lval, color):
+        if self.storage_mode == 'events':
+            return self._append_event('upsert', 'level_colors', [ltype, lval], {'level_type': ltype, 'level_value': lval, 'color': color})
         sh = self._get_sheet_obj()
         ws = sh.worksheet('level_colors')
         data = ws.get_all_values()
@@ -150,7 +850,7 @@ class Database:
                 ws.update_cell(i, 3, color)
                 found = True; break
         if not found: ws.append_row([ltype, lval, color])
-        self._clear_cache()
+        self._publish('level_colors', 'upsert', [ltype, lval], {'level_type': ltype, 'level_value': lval, 'color': color})
 
     # --- KLASÖRLER ---
     def get_folders(self, f_type):
@@ -164,8 +864,7 @@ class Database:
         self._add_row('folders', [name, f_type, tag])
 
     def update_folder(self, folder_id, name, tag):
-        self._update_cell('folders', folder_id, 'name', name)
-        self._update_cell('folders', folder_id, 'tag', tag)
+        self._update_row('folders', folder_id, {'name': name, 'tag': tag})
 
     def delete_folder(self, folder_id):
         self._delete_row('folders', folder_id)
@@ -193,22 +892,71 @@ class Database:
         return list(df[['id', 'folder_id', 'task', 'is_done', 'importance', 'effort', 'date', 'tag']].itertuples(index=False, name=None))
 
     def add_todo(self, folder_id, task, importance, effort, tag):
+        mark = self._mark_versions('todos')
         date = datetime.now().strftime('%d %b, %H:%M')
         if tag: self.add_or_update_task_tag(tag, random.choice(DEFAULT_TAG_COLORS), True)
-        self._add_row('todos', [folder_id, task, 0, importance, effort, date, tag])
+        new_id = self._add_row('todos', [folder_id, task, 0, importance, effort, date, tag])
+        if self._next_up: self._next_up.put((new_id, folder_id, task, 0, importance, effort, date, tag))
+        self._sync_next_up(mark)
 
     def update_todo(self, todo_id, task, importance, effort, tag):
         # Batch update (Hücre aralığı güncelleme) yerine tek tek ama güvenli
-        self._update_cell('todos', todo_id, 'task', task)
-        self._update_cell('todos', todo_id, 'importance', importance)
-        self._update_cell('todos', todo_id, 'effort', effort)
-        self._update_cell('todos', todo_id, 'tag', tag)
+        mark = self._mark_versions('todos')
+        written = self._update_row('todos', todo_id, {'task': task, 'importance': importance, 'effort': effort, 'tag': tag})
+        self._patch_next_up(todo_id, written)
+        self._sync_next_up(mark)
 
     def toggle_todo(self, todo_id, current_status):
-        self._update_cell('todos', todo_id, 'is_done', 1 if int(current_status)==0 else 0)
+        new = 1 if int(current_status)==0 else 0
+        mark = self._mark_versions('todos')
+        written = self._update_row('todos', todo_id, {'is_done': new})
+        self._patch_next_up(todo_id, written)
+        self._sync_next_up(mark)
 
     def delete_todo(self, todo_id):
-        self._delete_row('todos', todo_id)
+        mark = self._mark_versions('todos')
+        if self._delete_row('todos', todo_id) and self._next_up: self._next_up.discard(todo_id)
+        self._sync_next_up(mark)
+
+    # --- SIRADAKİ İŞLER ---
+    def _todos_version(self):
+        return self.get_snapshot_version('todos')
+
+    def _patch_next_up(self, todo_id, written):
+        """İndekse sadece gerçekten yazılan (yayınlanan) sütunları uygula; yazılamayan düzenleme görünmesin."""
+        row = self._next_up.get(todo_id) if self._next_up and written else None
+        if row: self._next_up.put(tuple(written.get(c, v) for c, v in zip(WORKSHEET_HEADERS['todos'], row)))
+
+    def _sync_next_up(self, mark):
+        """Kendi yazmamız indekse işlendi. Yazmadan önce indeks güncelse ve arada sadece biz yayın
+        yaptıysak yeni versiyonu kabul et; başka oturum da yazdıysa sonraki okumada baştan kurulsun."""
+        if self._next_up is None: return
+        if self._next_up.version == mark[0] and self._only_own_writes(mark):
+            self._next_up.version = self._todos_version()
+        else:
+            self._next_up.version = None
+
+    def _get_next_up_index(self, weights=None):
+        weights = dict(weights or NEXT_UP_WEIGHTS)
+        idx = self._next_up
+        # Başka bir oturum yazdıysa (veya snapshot yenilendiyse) versiyon değişir, baştan kur
+        if idx is None or idx.weights != weights or idx.version != self._todos_version():
+            idx = self._next_up = NextUpIndex.from_df(self._get_df('todos'), weights)
+            idx.version = self._todos_version()
+        return idx
+
+    def get_next_up(self, limit=20, weights=None, tag_list=None, imp_list=None, eff_list=None):
+        """Tüm klasörlerdeki açık görevlerden skoru en yüksek `limit` tanesi (get_todos ile aynı satır formatı)."""
+        folder_ids = {f[0] for f in self.get_folders('todo')}
+        imps = {LEVELS[i] for i in imp_list} if imp_list else None
+        effs = {LEVELS[e] for e in eff_list} if eff_list else None
+        def match(row):
+            if row[1] not in folder_ids: return False # Silinmiş klasörün görevleri
+            if tag_list and row[7] not in tag_list: return False
+            if imps and row[4] not in imps: return False
+            if effs and row[5] not in effs: return False
+            return True
+        return self._get_next_up_index(weights).top(limit, match)
 
     # --- NOTLAR ---
     def get_notes(self, folder_id):
@@ -222,38 +970,62 @@ class Database:
         self._add_row('notes', [folder_id, title, content, date])
 
     def update_note(self, note_id, title, content):
-        self._update_cell('notes', note_id, 'title', title)
-        self._update_cell('notes', note_id, 'content', content)
+        self._update_row('notes', note_id, {'title': title, 'content': content})
 
     def delete_note(self, note_id):
         self._delete_row('notes', note_id)
 
     # --- RUTİN ---
-    def get_weekly_tasks(self, day):
-        df = self._get_df('weekly_schedule')
-        if df.empty: return []
+    def _get_routine_index(self):
         today = datetime.now().strftime('%Y-%m-%d')
-        res = []
-        for row in df[df['day_name'] == day].sort_values(by='time_range').itertuples(index=False, name=None):
-            if row[4] == 1 and str(row[5]) != today:
-                self._update_cell('weekly_schedule', row[0], 'is_done', 0)
-                self._update_cell('weekly_schedule', row[0], 'last_completed_date', '')
-                res.append((row[0], row[1], row[2], row[3], 0, ''))
-            else: res.append(row)
-        return res
+        idx = self._routines
+        if idx is None or idx.today != today or idx.version != self.get_snapshot_version('weekly_schedule'):
+            mark = self._mark_versions('weekly_schedule')
+            idx = self._routines = RoutineIndex.from_df(self._get_df('weekly_schedule'), today)
+            for t_id in idx.stale_ids:
+                self._update_row('weekly_schedule', t_id, {'is_done': 0, 'last_completed_date': ''})
+            # İndeks sıfırlanmış halleri zaten içeriyor: arada sadece biz yazdıysak tekrar kurma,
+            # başka oturum da yazdıysa sonraki okumada baştan kurulsun
+            idx.version = self.get_snapshot_version('weekly_schedule') if self._only_own_writes(mark) else None
+        return idx
+
+    def get_weekly_tasks(self, day):
+        if day not in WEEK_DAYS: return []
+        return self._get_routine_index().by_day[WEEK_DAYS.index(day)]
+
+    def get_week(self):
+        """{gün adı: rutin listesi}, tüm hafta tek indeksten."""
+        idx = self._get_routine_index()
+        return dict(zip(WEEK_DAYS, idx.by_day))
+
+    def get_routine_now_next(self, now=None):
+        """(şu an süren rutinler, (sıradaki rutinin günü, satır) veya None)"""
+        return self._get_routine_index().now_next(now or datetime.now())
+
+    def get_routine_overlaps(self):
+        """Saat aralığı başka bir rutinle çakışan rutinlerin id'leri."""
+        return self._get_routine_index().overlap_ids
+
+    def get_multi_day_routines(self):
+        """Birden çok güne yayılan rutinlerin id'leri; tamamlanma işareti sadece bugün için geçerli."""
+        return self._get_routine_index().multi_day_ids
 
     def add_weekly_task(self, day, time, task):
         self._add_row('weekly_schedule', [day, time, task, 0, ''])
 
     def toggle_weekly_task(self, t_id, current_status):
         new = 1 if int(current_status)==0 else 0
-        self._update_cell('weekly_schedule', t_id, 'is_done', new)
-        self._update_cell('weekly_schedule', t_id, 'last_completed_date', datetime.now().strftime('%Y-%m-%d') if new else '')
+        self._update_row('weekly_schedule', t_id, {'is_done': new, 'last_completed_date': datetime.now().strftime('%Y-%m-%d') if new else ''})
 
     def delete_weekly_task(self, t_id):
         self._delete_row('weekly_schedule', t_id)
 
     # --- ETİKETLER ---
+    def _upsert_tag_event(self, worksheet_name, name, color, check_exist):
+        df = self._get_df(worksheet_name)
+        if check_exist and not df.empty and name in df['name'].values: return
+        self._append_event('upsert', worksheet_name, [name], {'name': name, 'color': color})
+
     def get_all_task_tags(self):
         df = self._get_df('tags')
         return [] if df.empty else list(df[['name', 'color']].sort_values(by='name').itertuples(index=False, name=None))
@@ -266,23 +1038,27 @@ class Database:
         except: return '#9B59B6'
 
     def add_or_update_task_tag(self, name, color, check_exist=False):
+        if self.storage_mode == 'events':
+            return self._upsert_tag_event('tags', name, color, check_exist)
         sh = self._get_sheet_obj()
         ws = sh.worksheet('tags')
         try:
             cell = ws.find(name, in_column=1)
             if not check_exist: 
                 ws.update_cell(cell.row, 2, color)
-                self._clear_cache()
+                self._publish('tags', 'upsert', [name], {'name': name, 'color': color})
         except:
             ws.append_row([name, color])
-            self._clear_cache()
+            self._publish('tags', 'upsert', [name], {'name': name, 'color': color})
 
     def delete_task_tag(self, tag_name):
+        if self.storage_mode == 'events':
+            return self._append_event('delete', 'tags', [tag_name])
         sh = self._get_sheet_obj()
         ws = sh.worksheet('tags')
         try: 
             ws.delete_rows(ws.find(tag_name, in_column=1).row)
-            self._clear_cache()
+            self._publish('tags', 'delete', [tag_name])
         except: pass
 
     # KLASÖR ETİKETLERİ
@@ -298,21 +1074,25 @@ class Database:
         except: return '#34495E'
 
     def add_or_update_folder_tag(self, name, color, check_exist=False):
+        if self.storage_mode == 'events':
+            return self._upsert_tag_event('folder_tags', name, color, check_exist)
         sh = self._get_sheet_obj()
         ws = sh.worksheet('folder_tags')
         try:
             cell = ws.find(name, in_column=1)
             if not check_exist: 
                 ws.update_cell(cell.row, 2, color)
-                self._clear_cache()
+                self._publish('folder_tags', 'upsert', [name], {'name': name, 'color': color})
         except:
             ws.append_row([name, color])
-            self._clear_cache()
+            self._publish('folder_tags', 'upsert', [name], {'name': name, 'color': color})
 
     def delete_folder_tag(self, tag_name):
+        if self.storage_mode == 'events':
+            return self._append_event('delete', 'folder_tags', [tag_name])
         sh = self._get_sheet_obj()
         ws = sh.worksheet('folder_tags')
         try: 
             ws.delete_rows(ws.find(tag_name, in_column=1).row)
-            self._clear_cache()
+            self._publish('folder_tags', 'delete', [tag_name])
         except: pass
\ No newline at end of file